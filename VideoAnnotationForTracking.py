@@ -34,19 +34,17 @@ For more information, please refer to <http://unlicense.org/>
 
 Dependencies
 - OpenCV
+- NumPy (comes with OpenCV)
 
 Known bugs
-- BBox-s are not restricted to the valid coords.
 - (If you found one, please report.)
 
 Likely future works [Importance][Hardness]
 - [*** ][*   ] Calc e.g. "output_%05d.png" automatically. Take vid dir path only.
-- [**  ][*   ] Fix the conditions in move_bbox_up, etc.
 - [**  ][*   ] Better memory management (Do not load all fra-s).
 - [*   ][*   ] An option to save anns ("all") in different formats (e.g. YOLO, Pascal VOC). Consider center and/or normalized coords.
 - [*   ][*   ] Interpolation with subpixel accuracy (use rounding only for visualization).
 - [**  ][**  ] Magnification for manual subpixel annotation & Scaling fra-s to fit to screen.
-- [*** ][*** ] Variable-size bbox-s (for each obj, maybe even for each obj-fra pair) & Rectangle bbox-s.
 
 Unlikely future works [Importance][Hardness]                        --- Feel free to fork.
 - [*** ][****] Other shapes (Circles, custom obj masks)             --> Currently I do not need.
@@ -93,9 +91,12 @@ Fra naming
 
 Format of anns
 - Two CSV files in gt dir (a subdir of vid dir) for each obj:
-- (1) objno-key.csv (only key fra-s)
-- (2) objno-all.csv (all fra-s)
+- (1) objid_key.csv (only key fra-s)
+- (2) objid_all.csv (all fra-s)
 - Columns: frano, tlx, tly, w, h
+- Obj ids are stable (they are not shifted when an obj is del.).
+- Shards are subdirs of gt_shards dir (a subdir of vid dir) w/ the same format and a claim.json file.
+- Merged shards are moved to gt_shards_merged/roundno (a subdir of vid dir), so they are not merged again.
 
 ------------------------------------------------------------------------------------------------------------------------
 
@@ -104,7 +105,7 @@ How to use the tool?
 An end-to-end successful scenario
   [What to do]                          : [How to do it]
 - Enter vid path                        : console input
-- Enter size of bbox-s                  : console input
+- Enter default size of bbox-s          : console input (e.g. 30 for squares, 40x30 for rectangles)
 - For every obj:
 -    Create new obj (exc. firs obj)     :                     N
 -    Annotate curr obj
@@ -124,6 +125,26 @@ Modifying existing anns
 - Mark curr fra as sta : S             (Related fra-s will be interpolated.)
 - Mark curr fra as end : E             (Related fra-s will be interpolated.)
 - Move curr bbox       : Arrows, SPACE (Related fra-s will be interpolated.)
+- Resize curr bbox     : J, L, I, K    (Related fra-s will be interpolated, inc. w and h.)
+- Undo / redo          : Z, Y          (Consecutive moves/resizes of the same key fra are undone at once.)
+
+Validating anns
+- Validate curr anns   : V             (Out-of-frame bbox-s and overlapping obj-s are listed in console.)
+- Go to next problem   : P
+- Validate saved anns  : python VideoAnnotationForTracking.py validate vid_path [vid_path ...]
+                         (No GUI. Also finds fra-s out of vid, gaps and "key"/"all" inconsistencies.
+                          Prints a JSON report.)
+
+Annotating w/ others (shards)
+- Claim a part of vid      : console input (shard no, then a fra range and/or obj ids, e.g. 1-500 and 0,3)
+                             (Claimed part of gt is copied to the shard. Each annotator uses a different shard no.)
+- Annotate and save        : as usual (ENTER saves to the shard, not to gt.)
+- Del obj copied from gt   : DEL           (Whole track is del. from gt at merge, not only claimed fra-s.)
+- Continue annotating      : console input (same shard no; claim is read from the shard)
+- Merge shards into gt     : python VideoAnnotationForTracking.py merge vid_path [vid_path ...]
+                             (Claims must not overlap. Tracks w/ the same obj id are stitched across fra ranges,
+                              so create obj-s that span several fra ranges before sharding.
+                              Merged shards are moved to gt_shards_merged. Then shard nos can be claimed again.)
 
 Notes
 - Do not forget to save! (ENTER)
@@ -146,11 +167,13 @@ M                : go to mid fra in curr range
                    Control obj-s
 -, +             : go to prev/next obj
 N                : create new obj
-DEL              : del curr obj (next obj-s will be shifted)
+DEL              : del curr obj (ids of other obj-s do not change)
 
                    Control bbox-s
 ←, ↑, ↓, →       : move bbox by 1 pixel
 Numeric arrows   : move bbox by 40 pixels
+J, L             : make bbox narrower/wider by 2 pixels (center is kept, unless bbox is at fra border)
+K, I             : make bbox shorter/taller by 2 pixels (center is kept, unless bbox is at fra border)
 SPACE            : mark key fra (=confirm) (curr fra will be selected as key fra)
 S                : mark as sta
 E                : mark as end
@@ -158,6 +181,9 @@ BACKSPACE        : unmark
 
                    Tools
 ENTER            : save
+Z, Y             : undo/redo (last 1000 edits are kept)
+V                : validate anns
+P                : go to next problem (found by validation)
 ESC              : exit (w/o saving)
 
                    View
@@ -191,6 +217,20 @@ OBJ_INFO_COORDS = (100, 100)
 DEFAULT_ANN_DIR = "gt"
 
 DEFAULT_FAST_MOV_AMOUNT = 40
+DEFAULT_RESIZE_AMOUNT   = 2  # must be even (bbox-s have even w and h)
+
+DEFAULT_HISTORY_LIMIT = 1000 # max number of edits that can be undone
+
+DEFAULT_OVERLAP_IOU      = 0.7 # obj-s overlapping at least this much ...
+DEFAULT_OVERLAP_MIN_FRAS = 10  # ... in at least this many fra-s are reported as duplicates
+
+DEFAULT_SHARD_DIR        = "gt_shards"
+DEFAULT_MERGED_SHARD_DIR = "gt_shards_merged" # merged shards are moved here (one subdir for each merge)
+SHARD_CLAIM_FILE         = "claim.json"
+SHARD_OBJ_ID_STRIDE      = 1000000 # new obj-s of shard n get ids from n * SHARD_OBJ_ID_STRIDE
+
+VALIDATE_COMMAND = "validate"
+MERGE_COMMAND    = "merge"
 
 GO_TO_STA_FRA_KEY  = 49
 GO_TO_END_FRA_KEY  = 52
@@ -213,6 +253,11 @@ FAST_MOVE_BBOX_RIGHT_KEY = 152
 FAST_MOVE_BBOX_UP_KEY    = 151
 FAST_MOVE_BBOX_DOWN_KEY  = 153
 
+NARROW_BBOX_KEY   = 106
+WIDEN_BBOX_KEY    = 108
+SHORTEN_BBOX_KEY  = 107
+HEIGHTEN_BBOX_KEY = 105
+
 MARK_KEY_FRA_KEY    = 32
 MARK_AS_STA_KEY     = 115
 MARK_AS_END_KEY     = 101
@@ -220,6 +265,12 @@ UNMARK_KEY_FRA_KEY  = 8
 
 SAVE_KEY            = 13
 
+UNDO_KEY            = 122
+REDO_KEY            = 121
+
+VALIDATE_KEY           = 118
+GO_TO_NEXT_PROBLEM_KEY = 112
+
 TOGGLE_FRA_INFO_KEY = 102
 TOGGLE_OBJ_INFO_KEY = 111
 
@@ -228,7 +279,14 @@ EXIT_KEY            = 27
 ### Imports
 
 import cv2 as cv
+import json
+import numpy as np
 import os
+import re
+import sys
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
 ### Classes
 
@@ -296,73 +354,199 @@ class BBox:
         self.tlx += pixels
         self.update_all()
 
+    def resize(self, dw:int=0, dh:int=0):
+        # Keeps cp.
+        assert dw % 2 == 0
+        assert dh % 2 == 0
+        assert self.w + dw > 0
+        assert self.h + dh > 0
+
+        cp = self.cp
+        self.w += dw
+        self.h += dh
+        self.set_cp(cp)
+
+    def values(self):
+        return (self.tlx, self.tly, self.w, self.h)
+
+    @staticmethod
+    def from_values(values):
+        tlx, tly, w, h = values
+        return BBox(w, h).set_tl((tlx, tly))
+
     def update_all(self):
         self.tl = (self.tlx              , self.tly              )
         self.cp = (self.tlx + self.w // 2, self.tly + self.h // 2)
         self.br = (self.tlx + self.w     , self.tly + self.h     )
 
+class History:
+    # Undo/redo stacks. An edit is a list of small reversible deltas (not a copy of the obj-s):
+    # - ("key" , obj, fra_no, old, new) : key fra added/changed/removed (old/new are BBox values or None)
+    # - ("bbox", obj, fra_no, old, new) : key fra bbox moved/resized (consecutive ones are merged into one edit)
+    # - ("sta" , obj, old, new)         : sta fra changed
+    # - ("end" , obj, old, new)         : end fra changed
+    # - ("obj" , obj_no, obj, added)    : obj inserted (added) or deleted (not added) at obj_no
+    # - ("placeholder", obj, old, new)  : auto-created obj changed for the firs time (logged before the change)
+
+    def __init__(self, limit:int=DEFAULT_HISTORY_LIMIT):
+        self.undo_edits = deque(maxlen=limit) # oldest edits are dropped, so memory stays bounded
+        self.redo_edits = []
+        self.pending    = []
+
+    def log(self, delta:tuple):
+        self.pending.append(delta)
+
+    def commit(self):
+        # Closes the edit of the last action (if it changed anything).
+        if len(self.pending) == 0: return
+        edit, self.pending = self.pending, []
+        if self.can_merge(edit):
+            kind, obj, fra_no, old, _ = self.undo_edits[-1][-1]
+            self.undo_edits[-1][-1] = (kind, obj, fra_no, old, edit[0][4])
+        else:
+            self.undo_edits.append(edit)
+        self.redo_edits.clear()
+
+    def can_merge(self, edit:list):
+        if len(self.redo_edits) > 0 or len(self.undo_edits) == 0: return False
+        last_edit = self.undo_edits[-1]
+        kinds = [delta[0] for delta in last_edit]
+        if len(edit) != 1 or kinds not in (["bbox"], ["placeholder", "bbox"]): return False
+        delta, last_delta = edit[0], last_edit[-1]
+        return delta[0] == last_delta[0] == "bbox" and delta[1] is last_delta[1] and delta[2] == last_delta[2]
+
+    def clear(self):
+        self.undo_edits.clear()
+        self.redo_edits.clear()
+        self.pending = []
+
+    def undo(self, objs:list):
+        # Returns the touched obj and fra (see touched), or None if there is nothing to undo.
+        self.commit()
+        if len(self.undo_edits) == 0: return None
+        edit = self.undo_edits.pop()
+        for delta in reversed(edit):
+            History.apply(delta, objs, undo=True)
+        self.redo_edits.append(edit)
+        return History.touched(edit, undo=True)
+
+    def redo(self, objs:list):
+        # Returns the touched obj and fra (see touched), or None if there is nothing to redo.
+        self.commit()
+        if len(self.redo_edits) == 0: return None
+        edit = self.redo_edits.pop()
+        for delta in edit:
+            History.apply(delta, objs, undo=False)
+        self.undo_edits.append(edit)
+        return History.touched(edit, undo=False)
+
+    @staticmethod
+    def apply(delta:tuple, objs:list, undo:bool):
+        kind = delta[0]
+        if kind in ("key", "bbox"):
+            _, obj, fra_no, old, new = delta
+            values = old if undo else new
+            if values is None:
+                del obj.key_fras[fra_no]
+            else:
+                obj.key_fras[fra_no] = BBox.from_values(values)
+                obj.update_default_size(fra_no)
+            obj.key_fras_changed()
+        elif kind in ("sta", "end", "placeholder"):
+            _, obj, old, new = delta
+            setattr(obj, "placeholder" if kind == "placeholder" else kind + "_fra_no", old if undo else new)
+        elif kind == "obj":
+            _, obj_no, obj, added = delta
+            if added != undo:
+                objs.insert(obj_no, obj)
+            else:
+                del objs[obj_no]
+
+    @staticmethod
+    def touched(edit:list, undo:bool):
+        # Returns (obj, fra_no) to show after undo/redo: the sta/end fra if it changed, else the firs changed key fra.
+        # fra_no is None if only obj-s were inserted/deleted.
+        for delta in edit:
+            if delta[0] in ("sta", "end"):
+                _, obj, old, new = delta
+                return obj, old if undo else new
+        for delta in edit:
+            if delta[0] in ("key", "bbox"):
+                return delta[1], delta[2]
+        return edit[0][2], None
+
 class Obj:
 
-    def __init__(self, bbox_size:int, fra_count:int):
-        assert fra_count > 1
+    def __init__(self, obj_id:int, bbox_w:int, bbox_h:int, fra_count:int, history:History=None,
+                 firs_fra_no:int=0, last_fra_no:int=None):
+        # firs_fra_no and last_fra_no limit sta/end fra-s (e.g. to the fra range of a shard).
+        if last_fra_no is None: last_fra_no = fra_count - 1
+        assert 0 <= firs_fra_no < last_fra_no < fra_count
 
+        self.obj_id    = obj_id # stable (used in file names, not changed when other obj-s are del.)
+        self.placeholder = False # True if auto-created and not changed yet
         self.fra_count = fra_count
-        self.bbox_size = bbox_size
+        self.bbox_w    = bbox_w # default size of new bbox-s of this obj (each key fra has its own size)
+        self.bbox_h    = bbox_h
+        self.history   = history
 
-        self.firs_fra_no = 0
-        self.last_fra_no = fra_count - 1
+        self.firs_fra_no = firs_fra_no
+        self.last_fra_no = last_fra_no
 
         self.sta_fra_no = self.firs_fra_no
         self.end_fra_no = self.last_fra_no
         self.key_fras:dict[int,BBox] = {
-            self.sta_fra_no : BBox(bbox_size, bbox_size).set_tl((0, 0)),
-            self.end_fra_no : BBox(bbox_size, bbox_size).set_tl((0, 0))
+            self.sta_fra_no : BBox(bbox_w, bbox_h).set_tl((0, 0)),
+            self.end_fra_no : BBox(bbox_w, bbox_h).set_tl((0, 0))
         }
+        self.sorted_key_fra_nos = None # cache for interpolation (None if key fra-s changed)
 
     def set_sta_fra(self, sta_fra_no:int, bbox:BBox):
-        assert 0 <= sta_fra_no < self.fra_count
+        assert self.firs_fra_no <= sta_fra_no <= self.last_fra_no
 
         if sta_fra_no >= self.end_fra_no:
             print("Invalid sta fra (Choose before end fra).")
             return
 
         if sta_fra_no == self.sta_fra_no:
-            self.key_fras[sta_fra_no] = bbox
+            self.put_key_fra(sta_fra_no, bbox)
             return
 
         if sta_fra_no > self.sta_fra_no:
             # Delete from self.key_fras
             for fra_no in range(self.sta_fra_no, sta_fra_no):
                 if self.is_key_fra(fra_no):
-                    del self.key_fras[fra_no]
+                    self.pop_key_fra(fra_no)
 
         # If sta_fra_no < self.sta_fra_no, old sta fra is still a key fra)
 
-        if bbox is None: bbox = BBox(self.bbox_size, self.bbox_size).set_tl((0, 0))
-        self.key_fras[sta_fra_no] = bbox
+        if bbox is None: bbox = BBox(self.bbox_w, self.bbox_h).set_tl((0, 0))
+        self.put_key_fra(sta_fra_no, bbox)
+        self.log(("sta", self, self.sta_fra_no, sta_fra_no))
         self.sta_fra_no = sta_fra_no
 
     def set_end_fra(self, end_fra_no:int, bbox:BBox):
-        assert 0 <= end_fra_no < self.fra_count
+        assert self.firs_fra_no <= end_fra_no <= self.last_fra_no
 
         if end_fra_no <= self.sta_fra_no:
             print("Invalid end fra (Choose after sta fra).")
             return
 
         if end_fra_no == self.end_fra_no:
-            self.key_fras[end_fra_no] = bbox
+            self.put_key_fra(end_fra_no, bbox)
             return
 
         if end_fra_no < self.end_fra_no:
             # Delete from self.key_fras
             for fra_no in range(end_fra_no + 1, self.end_fra_no + 1):
                 if self.is_key_fra(fra_no):
-                    del self.key_fras[fra_no]
+                    self.pop_key_fra(fra_no)
 
         # If end_fra_no > self.end_fra_no, old end fra is still a key fra)
 
-        if bbox is None: bbox = BBox(self.bbox_size, self.bbox_size).set_tl((0, 0))
-        self.key_fras[end_fra_no] = bbox
+        if bbox is None: bbox = BBox(self.bbox_w, self.bbox_h).set_tl((0, 0))
+        self.put_key_fra(end_fra_no, bbox)
+        self.log(("end", self, self.end_fra_no, end_fra_no))
         self.end_fra_no = end_fra_no
 
     def mark_key_fra(self, fra_no:int, bbox:BBox):
@@ -372,7 +556,7 @@ class Obj:
             print("Invalid key fra (Choose between sta and end fra-s).")
             return
 
-        self.key_fras[fra_no] = bbox
+        self.put_key_fra(fra_no, bbox)
 
     def unmark_key_fra(self, fra_no:int):
         assert 0 <= fra_no < self.fra_count
@@ -382,7 +566,41 @@ class Obj:
             return
 
         if fra_no in self.key_fras:
-            del self.key_fras[fra_no]
+            self.pop_key_fra(fra_no)
+
+    def put_key_fra(self, fra_no:int, bbox:BBox):
+        old = self.key_fras.get(fra_no)
+        if old is not bbox:
+            self.log(("key", self, fra_no, None if old is None else old.values(), bbox.values()))
+        if old is None:
+            self.key_fras_changed()
+        self.key_fras[fra_no] = bbox
+
+    def pop_key_fra(self, fra_no:int):
+        bbox = self.key_fras.pop(fra_no)
+        self.key_fras_changed()
+        self.log(("key", self, fra_no, bbox.values(), None))
+
+    def update_default_size(self, fra_no:int):
+        # Resizing sta/end bbox changes the size of new bbox-s of this obj.
+        if fra_no in (self.sta_fra_no, self.end_fra_no):
+            self.bbox_w, self.bbox_h = self.key_fras[fra_no].w, self.key_fras[fra_no].h
+
+    def key_fras_changed(self):
+        self.sorted_key_fra_nos = None
+
+    def get_sorted_key_fra_nos(self):
+        if self.sorted_key_fra_nos is None:
+            self.sorted_key_fra_nos = sorted(self.key_fras.keys())
+        return self.sorted_key_fra_nos
+
+    def log(self, delta:tuple):
+        # Called for every change of obj.
+        if self.history is not None:
+            if self.placeholder:
+                self.history.log(("placeholder", self, True, False))
+            self.history.log(delta)
+        self.placeholder = False
 
     def get_bbox(self, fra_no:int):
         if fra_no < self.sta_fra_no or fra_no > self.end_fra_no:
@@ -390,37 +608,90 @@ class Obj:
         elif fra_no in self.key_fras:
             return self.key_fras[fra_no]    # Key frame
         else:
-            for f in reversed(range(self.sta_fra_no, fra_no)):
-                if f in self.key_fras:
-                    min_fra_no = f
-                    min_bbox   = self.key_fras[f]
-                    break
-            for f in range(fra_no + 1, self.end_fra_no + 1):
-                if f in self.key_fras:
-                    max_fra_no = f
-                    max_bbox   = self.key_fras[f]
-                    break
-            ratio    = (fra_no - min_fra_no) / (max_fra_no - min_fra_no)
-            tlx_dist = max_bbox.tlx - min_bbox.tlx
-            tly_dist = max_bbox.tly - min_bbox.tly
-            tlx      = round(min_bbox.tlx + ratio * tlx_dist)
-            tly      = round(min_bbox.tly + ratio * tly_dist)
-            tl       = (tlx, tly)
-            bbox     = BBox(self.bbox_size, self.bbox_size).set_tl(tl)
-            return bbox
+            key_fra_nos = self.get_sorted_key_fra_nos()
+            i           = bisect_right(key_fra_nos, fra_no)
+            min_fra_no  = key_fra_nos[i - 1]
+            max_fra_no  = key_fra_nos[i]
+            values      = Obj.interpolate(fra_no, min_fra_no, self.key_fras[min_fra_no], max_fra_no, self.key_fras[max_fra_no])
+            return BBox.from_values(values)
+
+    def iter_values(self):
+        # Yields (fra_no, tlx, tly, w, h) for all fra-s from sta to end w/o creating a BBox for each fra.
+        key_fra_nos = self.get_sorted_key_fra_nos()
+        for min_fra_no, max_fra_no in zip(key_fra_nos, key_fra_nos[1:]):
+            min_bbox = self.key_fras[min_fra_no]
+            max_bbox = self.key_fras[max_fra_no]
+            yield (min_fra_no,) + min_bbox.values()
+            for fra_no in range(min_fra_no + 1, max_fra_no):
+                yield (fra_no,) + Obj.interpolate(fra_no, min_fra_no, min_bbox, max_fra_no, max_bbox)
+        yield (self.end_fra_no,) + self.key_fras[self.end_fra_no].values()
+
+    @staticmethod
+    def interpolate(fra_no:int, min_fra_no:int, min_bbox:BBox, max_fra_no:int, max_bbox:BBox):
+        # Returns (tlx, tly, w, h). w and h are rounded to even numbers.
+        ratio = (fra_no - min_fra_no) / (max_fra_no - min_fra_no)
+        tlx   = round(min_bbox.tlx + ratio * (max_bbox.tlx - min_bbox.tlx))
+        tly   = round(min_bbox.tly + ratio * (max_bbox.tly - min_bbox.tly))
+        w     = 2 * round((min_bbox.w + ratio * (max_bbox.w - min_bbox.w)) / 2)
+        h     = 2 * round((min_bbox.h + ratio * (max_bbox.h - min_bbox.h)) / 2)
+        return (tlx, tly, w, h)
 
     def is_key_fra(self, fra_no:int):
         return fra_no in self.key_fras
 
-class Vid:
+class Shard:
+    # Part of anns claimed by one annotator: a fra range and/or a subset of obj-s (None means all).
+
+    def __init__(self, shard_no:int, fra_range:tuple=None, obj_ids:list=None, seeded_obj_ids:list=(), deleted_obj_ids:list=()):
+        # Raises ValueError for invalid user input.
+        if shard_no <= 0:
+            raise ValueError("Shard no must be positive.")
+        if fra_range is not None and (len(fra_range) != 2 or not 1 <= fra_range[0] < fra_range[1]): # franos as in CSV files (inclusive)
+            raise ValueError("Invalid fra range {}.".format("-".join(map(str, fra_range))))
+
+        self.shard_no       = shard_no
+        self.fra_range      = None if fra_range is None else tuple(fra_range)
+        self.obj_ids        = None if obj_ids   is None else set(obj_ids)
+        self.seeded_obj_ids  = set(seeded_obj_ids)  # obj-s copied from gt (only their claimed fra-s are replaced at merge)
+        self.deleted_obj_ids = set(deleted_obj_ids) # seeded obj-s del. in this shard (whole tracks are del. at merge)
+        self.first_obj_id   = shard_no * SHARD_OBJ_ID_STRIDE # ids of new obj-s do not collide across shards
+
+    def get_path(self, vid_path:str):
+        return "{}/{}".format(get_shards_path(vid_path), self.shard_no)
+
+    def owns_obj_id(self, obj_id:int):
+        # True if obj id is one of the ids given to new obj-s of this shard (also in earlier merged rounds).
+        return self.first_obj_id <= obj_id < self.first_obj_id + SHARD_OBJ_ID_STRIDE
+
+    def claims_obj(self, obj_id:int):
+        if self.owns_obj_id(obj_id): return True # new obj of this shard
+        return self.obj_ids is None or obj_id in self.obj_ids
+
+    def overlaps(self, other:"Shard"):
+        if self.fra_range is not None and other.fra_range is not None:
+            if self.fra_range[1] < other.fra_range[0] or other.fra_range[1] < self.fra_range[0]: return False
+        return self.obj_ids is None or other.obj_ids is None or len(self.obj_ids & other.obj_ids) > 0
+
+    def save_claim(self, path:str):
+        claim = {
+            "shard"     : self.shard_no,
+            "fra_range" : None if self.fra_range is None else list(self.fra_range),
+            "obj_ids"   : None if self.obj_ids   is None else sorted(self.obj_ids),
+            "seeded_obj_ids"  : sorted(self.seeded_obj_ids),
+            "deleted_obj_ids" : sorted(self.deleted_obj_ids)
+        }
+        with open("{}/{}".format(path, SHARD_CLAIM_FILE), "w") as file:
+            json.dump(claim, file)
 
-    def __init__(self, vid_path:str, bbox_size:int, scale:float=None, fra_limit:int=None):
+    @staticmethod
+    def load_claim(path:str):
+        with open("{}/{}".format(path, SHARD_CLAIM_FILE)) as file:
+            claim = json.load(file)
+        return Shard(claim["shard"], claim["fra_range"], claim["obj_ids"], claim["seeded_obj_ids"], claim["deleted_obj_ids"])
 
-        def read_text_file(path):
-            file = open(path)
-            lines = file.read().splitlines()
-            file.close()
-            return lines
+class Vid:
+
+    def __init__(self, vid_path:str, bbox_w:int, bbox_h:int, scale:float=None, fra_limit:int=None, shard:"Shard"=None):
 
         print("It may take a while to read all frames.")
         # Load vid into memory
@@ -437,10 +708,16 @@ class Vid:
             fra_count += 1
         reader.release()
 
+        if shard is not None and shard.fra_range is not None and shard.fra_range[0] >= len(fras):
+            # Checked before shard dir is created (at least 2 fra-s of the range must be in vid)
+            raise ValueError("Claimed fra range {}-{} is not in vid (fra-s 1-{}).".format(*shard.fra_range, len(fras)))
+
         # Store values
         self.vid_path   = vid_path
-        self.ann_path   = vid_path[:vid_path.rfind("/")+1] + DEFAULT_ANN_DIR
-        self.bbox_size  = bbox_size
+        self.ann_path   = get_ann_path(vid_path) if shard is None else shard.get_path(vid_path)
+        self.shard      = shard
+        self.bbox_w     = bbox_w # default size of new obj-s
+        self.bbox_h     = bbox_h
 
         self.show_fra_info = DEFAULT_FRA_INFO
         self.show_obj_info = DEFAULT_OBJ_INFO
@@ -449,38 +726,64 @@ class Vid:
         self.fra_h      = fras[0].shape[0]
 
         self.fras       = fras
-        self.active_fra = 0
+        self.firs_fra_no = 0 if shard is None or shard.fra_range is None else shard.fra_range[0] - 1
+        self.last_fra_no = len(fras) - 1 if shard is None or shard.fra_range is None else min(shard.fra_range[1], len(fras)) - 1
+        self.active_fra = self.firs_fra_no
+
+        self.objs        = []
+        self.active_obj  = 0
+        self.next_obj_id = 0 if shard is None else shard.first_obj_id
+        if shard is not None:
+            # New obj-s of this shard no. may already be in gt (merged earlier), their ids must not be reused.
+            gt_obj_ids = [obj_id for obj_id in read_obj_ids(get_ann_path(vid_path)) if shard.owns_obj_id(obj_id)]
+            self.next_obj_id = max([self.next_obj_id] + [obj_id + 1 for obj_id in gt_obj_ids])
 
-        self.objs       = []
-        self.active_obj = 0
+        self.active_bbox = BBox(bbox_w, bbox_h)
 
-        self.active_bbox = BBox(bbox_size, bbox_size)
+        self.history    = History()
+
+        self.problems   = [] # found by validate()
+        self.problem_no = -1
 
         # Create ann dir if not exists
         if os.path.exists(self.ann_path):
-            files_count = len(os.listdir(self.ann_path))
-            if files_count > 0:
-                for obj_no in range(files_count // 2):
-                    file = "{}_key.csv".format(obj_no)
-                    self.create_new_obj()
-                    obj = self.objs[-1]
-                    lines = read_text_file(self.ann_path + "/" + file)
-                    firs_row = list(map(int, lines[ 0].split(",")))
-                    last_row = list(map(int, lines[-1].split(",")))
-                    sta_bbox = BBox(firs_row[3], firs_row[4]).set_tl((firs_row[1], firs_row[2]))
-                    end_bbox = BBox(last_row[3], last_row[4]).set_tl((last_row[1], last_row[2]))
-                    obj.set_sta_fra(firs_row[0] - 1, sta_bbox) # -1 because here we start from 0.
-                    obj.set_end_fra(last_row[0] - 1, end_bbox)
-                    for line in lines[1:-1]:
-                        row = list(map(int, line.split(",")))
-                        bbox = BBox(row[3], row[4]).set_tl((row[1], row[2]))
-                        obj.mark_key_fra(row[0] - 1, bbox)
-                self.update_active_bbox()
+            for obj_id in read_obj_ids(self.ann_path):
+                self.load_obj(obj_id, read_track("{}/{}_key.csv".format(self.ann_path, obj_id)))
+        elif shard is not None:
+            # New shard: start from claimed part of gt
+            base_ann_path = get_ann_path(vid_path)
+            if os.path.exists(base_ann_path):
+                for obj_id in read_obj_ids(base_ann_path):
+                    if not shard.claims_obj(obj_id): continue
+                    key_track = read_track("{}/{}_key.csv".format(base_ann_path, obj_id))
+                    key_track = clip_key_track(key_track, self.firs_fra_no + 1, self.last_fra_no + 1)
+                    if key_track is not None:
+                        self.load_obj(obj_id, key_track)
+                        shard.seeded_obj_ids.add(obj_id)
+            os.makedirs(self.ann_path)
+            shard.save_claim(self.ann_path)
+            self.save() # Otherwise merging an unsaved shard would del its claimed anns.
         else:
             os.mkdir(self.ann_path)
 
         if len(self.objs) == 0:
-            self.create_new_obj()
+            self.create_new_obj(placeholder=True)
+        else:
+            self.update_active_bbox()
+
+        self.history.clear() # Loaded anns cannot be undone.
+
+    def load_obj(self, obj_id:int, key_track:np.ndarray):
+        # key_track: rows of key fra-s as in "key" CSV files.
+        self.create_new_obj(obj_id)
+        obj = self.objs[-1]
+        sta_bbox = BBox.from_values(key_track[ 0, 1:].tolist())
+        end_bbox = BBox.from_values(key_track[-1, 1:].tolist())
+        obj.bbox_w, obj.bbox_h = sta_bbox.w, sta_bbox.h
+        obj.set_sta_fra(int(key_track[ 0, 0]) - 1, sta_bbox) # -1 because here we start from 0.
+        obj.set_end_fra(int(key_track[-1, 0]) - 1, end_bbox)
+        for row in key_track[1:-1].tolist():
+            obj.mark_key_fra(row[0] - 1, BBox.from_values(row[1:]))
 
     def update_active_bbox(self):
         self.active_bbox = self.objs[self.active_obj].get_bbox(self.active_fra)
@@ -494,12 +797,12 @@ class Vid:
         self.update_active_bbox()
 
     def go_to_prev_fra(self):
-        if self.active_fra > 0:
+        if self.active_fra > self.firs_fra_no:
             self.active_fra -= 1
             self.update_active_bbox()
 
     def go_to_next_fra(self):
-        if self.active_fra < len(self.fras) - 1:
+        if self.active_fra < self.last_fra_no:
             self.active_fra += 1
             self.update_active_bbox()
 
@@ -536,57 +839,112 @@ class Vid:
             self.active_obj += 1
             self.update_active_bbox()
 
-    def create_new_obj(self):
-        obj = Obj(self.bbox_size, len(self.fras))
+    def create_new_obj(self, obj_id:int=None, placeholder:bool=False):
+        if obj_id is None: obj_id = self.next_obj_id
+        self.next_obj_id = max(self.next_obj_id, obj_id + 1)
+        obj = Obj(obj_id, self.bbox_w, self.bbox_h, len(self.fras), self.history, self.firs_fra_no, self.last_fra_no)
+        obj.placeholder = placeholder
         self.objs.append(obj)
+        self.history.log(("obj", len(self.objs) - 1, obj, True))
         self.active_obj = len(self.objs) - 1
         self.update_active_bbox()
 
     def del_curr_obj(self):
-        del self.objs[0]
+        obj = self.objs.pop(self.active_obj)
+        self.history.log(("obj", self.active_obj, obj, False))
+        if self.shard is not None and obj.obj_id in self.shard.seeded_obj_ids:
+            print("Obj {} will be del. from gt (whole track) when shards are merged.".format(obj.obj_id))
         if len(self.objs) == 0:
-            self.create_new_obj()
+            self.create_new_obj(placeholder=True)
+        self.active_obj = min(self.active_obj, len(self.objs) - 1)
         self.update_active_bbox()
 
+    def change_active_bbox(self, change, *args):
+        # Moves/resizes of key fra-s change anns directly, so they are logged for undo.
+        old = self.active_bbox.values()
+        change(*args)
+        obj = self.objs[self.active_obj]
+        if obj.key_fras.get(self.active_fra) is self.active_bbox:
+            obj.log(("bbox", obj, self.active_fra, old, self.active_bbox.values()))
+            obj.update_default_size(self.active_fra)
+
     def move_bbox_1px_up(self):
         if self.active_bbox is None: return
-        if self.active_bbox.tlx > 0:
-            self.active_bbox.move_up()
+        if self.active_bbox.tly > 0:
+            self.change_active_bbox(self.active_bbox.move_up, 1)
 
     def move_bbox_1px_down(self):
         if self.active_bbox is None: return
-        if self.active_bbox.tlx + self.active_bbox.w < self.fra_w - 1:
-            self.active_bbox.move_down()
+        if self.active_bbox.tly + self.active_bbox.h < self.fra_h:
+            self.change_active_bbox(self.active_bbox.move_down, 1)
 
     def move_bbox_1px_left(self):
         if self.active_bbox is None: return
-        if self.active_bbox.tly > 0:
-            self.active_bbox.move_left()
+        if self.active_bbox.tlx > 0:
+            self.change_active_bbox(self.active_bbox.move_left, 1)
 
     def move_bbox_1px_right(self):
         if self.active_bbox is None: return
-        if self.active_bbox.tly + self.active_bbox.h < self.fra_h - 1:
-            self.active_bbox.move_right()
+        if self.active_bbox.tlx + self.active_bbox.w < self.fra_w:
+            self.change_active_bbox(self.active_bbox.move_right, 1)
 
     def move_bbox_up(self):
         if self.active_bbox is None: return
-        if self.active_bbox.tlx > 0:
-            self.active_bbox.move_up(pixels=DEFAULT_FAST_MOV_AMOUNT)
+        pixels = min(DEFAULT_FAST_MOV_AMOUNT, self.active_bbox.tly)
+        if pixels > 0:
+            self.change_active_bbox(self.active_bbox.move_up, pixels)
 
     def move_bbox_down(self):
         if self.active_bbox is None: return
-        if self.active_bbox.tlx + self.active_bbox.w < self.fra_w - 1:
-            self.active_bbox.move_down(pixels=DEFAULT_FAST_MOV_AMOUNT)
+        pixels = min(DEFAULT_FAST_MOV_AMOUNT, self.fra_h - self.active_bbox.tly - self.active_bbox.h)
+        if pixels > 0:
+            self.change_active_bbox(self.active_bbox.move_down, pixels)
 
     def move_bbox_left(self):
         if self.active_bbox is None: return
-        if self.active_bbox.tly > 0:
-            self.active_bbox.move_left(pixels=DEFAULT_FAST_MOV_AMOUNT)
+        pixels = min(DEFAULT_FAST_MOV_AMOUNT, self.active_bbox.tlx)
+        if pixels > 0:
+            self.change_active_bbox(self.active_bbox.move_left, pixels)
 
     def move_bbox_right(self):
         if self.active_bbox is None: return
-        if self.active_bbox.tly + self.active_bbox.h < self.fra_h - 1:
-            self.active_bbox.move_right(pixels=DEFAULT_FAST_MOV_AMOUNT)
+        pixels = min(DEFAULT_FAST_MOV_AMOUNT, self.fra_w - self.active_bbox.tlx - self.active_bbox.w)
+        if pixels > 0:
+            self.change_active_bbox(self.active_bbox.move_right, pixels)
+
+    def narrow_bbox(self):
+        if self.active_bbox is None: return
+        if self.active_bbox.w > DEFAULT_RESIZE_AMOUNT:
+            self.change_active_bbox(self.active_bbox.resize, -DEFAULT_RESIZE_AMOUNT, 0)
+
+    def widen_bbox(self):
+        if self.active_bbox is None: return
+        bbox = self.active_bbox
+        if bbox.w + DEFAULT_RESIZE_AMOUNT > self.fra_w:
+            print("Bbox cannot be wider than fra.")
+            return
+        # Center is kept if possible, else bbox grows toward the side that has room.
+        tlx = min(max(bbox.tlx - DEFAULT_RESIZE_AMOUNT // 2, 0), self.fra_w - bbox.w - DEFAULT_RESIZE_AMOUNT)
+        self.change_active_bbox(self.resize_active_bbox, DEFAULT_RESIZE_AMOUNT, 0, (tlx, bbox.tly))
+
+    def shorten_bbox(self):
+        if self.active_bbox is None: return
+        if self.active_bbox.h > DEFAULT_RESIZE_AMOUNT:
+            self.change_active_bbox(self.active_bbox.resize, 0, -DEFAULT_RESIZE_AMOUNT)
+
+    def heighten_bbox(self):
+        if self.active_bbox is None: return
+        bbox = self.active_bbox
+        if bbox.h + DEFAULT_RESIZE_AMOUNT > self.fra_h:
+            print("Bbox cannot be taller than fra.")
+            return
+        # Center is kept if possible, else bbox grows toward the side that has room.
+        tly = min(max(bbox.tly - DEFAULT_RESIZE_AMOUNT // 2, 0), self.fra_h - bbox.h - DEFAULT_RESIZE_AMOUNT)
+        self.change_active_bbox(self.resize_active_bbox, 0, DEFAULT_RESIZE_AMOUNT, (bbox.tlx, tly))
+
+    def resize_active_bbox(self, dw:int, dh:int, tl:tuple):
+        self.active_bbox.resize(dw, dh)
+        self.active_bbox.set_tl(tl)
 
     def mark_sta(self):
         self.objs[self.active_obj].set_sta_fra(self.active_fra, self.active_bbox)
@@ -602,6 +960,48 @@ class Vid:
     def unmark_key(self):
         self.objs[self.active_obj].unmark_key_fra(self.active_fra)
 
+    def undo(self):
+        self.after_history_change(self.history.undo(self.objs))
+
+    def redo(self):
+        self.after_history_change(self.history.redo(self.objs))
+
+    def after_history_change(self, touched:tuple):
+        # Shows the changed obj and fra, so that undo/redo is visible.
+        if touched is None:
+            print("Nothing to undo/redo.")
+            return
+        obj, fra_no = touched
+        if obj in self.objs:
+            self.active_obj = self.objs.index(obj)
+        self.active_obj = min(self.active_obj, len(self.objs) - 1)
+        if fra_no is not None:
+            self.active_fra = fra_no
+        self.update_active_bbox()
+
+    def validate(self):
+        key_tracks = {obj.obj_id: get_key_track(obj) for obj in self.objs}
+        tracks     = {obj_id: interpolate_track(key_track) for obj_id, key_track in key_tracks.items()}
+        self.problems = []
+        for obj_id, track in tracks.items():
+            self.problems += check_bounds(obj_id, track, self.fra_w, self.fra_h)
+        self.problems += check_overlaps(key_tracks, tracks=tracks)
+        self.problem_no = -1
+        print("{} problem(s) found.".format(len(self.problems)))
+
+    def go_to_next_problem(self):
+        if len(self.problems) == 0:
+            print("No problems (Validate first).")
+            return
+        self.problem_no = (self.problem_no + 1) % len(self.problems)
+        problem = self.problems[self.problem_no]
+        obj_ids = [obj.obj_id for obj in self.objs]
+        if problem["obj"] in obj_ids:
+            self.active_obj = obj_ids.index(problem["obj"])
+        self.active_fra = min(max(problem["fra"] - 1, self.firs_fra_no), self.last_fra_no) # -1 because here we start from 0.
+        self.update_active_bbox()
+        print("Problem {}/{}: {}".format(self.problem_no + 1, len(self.problems), problem["message"]))
+
     def toggle_fra_info(self):
         self.show_fra_info = not self.show_fra_info
 
@@ -615,14 +1015,26 @@ class Vid:
             file.write(content)
             file.close()
 
-        for obj_no, obj in enumerate(self.objs):
-            key_csv_path = "{}/{}_key.csv".format(self.ann_path, obj_no)
-            all_csv_path  = "{}/{}_all.csv".format(self.ann_path, obj_no)
+        objs = self.objs
+        if self.shard is not None:
+            objs = [obj for obj in self.objs if not obj.placeholder] # must not be merged into gt
+        obj_ids = {obj.obj_id for obj in objs}
+        for obj_id in read_obj_ids(self.ann_path):
+            if obj_id not in obj_ids: # del obj
+                for kind in ("key", "all"):
+                    path = "{}/{}_{}.csv".format(self.ann_path, obj_id, kind)
+                    if os.path.exists(path): os.remove(path)
+        if self.shard is not None:
+            self.shard.deleted_obj_ids = self.shard.seeded_obj_ids - obj_ids
+            self.shard.save_claim(self.ann_path)
+
+        for obj in objs:
+            key_csv_path = "{}/{}_key.csv".format(self.ann_path, obj.obj_id)
+            all_csv_path  = "{}/{}_all.csv".format(self.ann_path, obj.obj_id)
             key_lines = ""
             all_lines = ""
-            for fra_no in range(obj.sta_fra_no, obj.end_fra_no + 1):
-                bbox = obj.get_bbox(fra_no)
-                line = "{},{},{},{},{}\n".format(fra_no + 1, bbox.tlx, bbox.tly, bbox.w, bbox.h) # +1 because here we start from 0.
+            for fra_no, tlx, tly, w, h in obj.iter_values():
+                line = "{},{},{},{},{}\n".format(fra_no + 1, tlx, tly, w, h) # +1 because here we start from 0.
                 if obj.is_key_fra(fra_no):
                     key_lines += line
                 all_lines += line
@@ -639,14 +1051,17 @@ class VidAnnGUI:
     def run(self):
 
         def add_obj_info(fra):
-            text = "Obj: {} (max:{})".format(self.vid.active_obj, len(self.vid.objs) - 1)
+            active_obj_id = self.vid.objs[self.vid.active_obj].obj_id
+            text = "Obj: {} ({}/{})".format(active_obj_id, self.vid.active_obj + 1, len(self.vid.objs))
+            if self.vid.shard is not None:
+                text += " Shard: {}".format(self.vid.shard.shard_no)
             cv.putText(fra, text, OBJ_INFO_COORDS, cv.FONT_HERSHEY_TRIPLEX, 1, OBJ_INFO_COLOR)
             for obj_no, obj in enumerate(self.vid.objs):
                 if obj_no == self.vid.active_obj: continue
                 bbox = obj.get_bbox(self.vid.active_fra)
                 if bbox is not None:
                     cv.rectangle(fra, bbox.tl, bbox.br, OBJ_INFO_COLOR, DEFAULT_THICKNESS)
-                    cv.putText(fra, str(obj_no), bbox.cp, cv.FONT_HERSHEY_TRIPLEX, 1, OBJ_INFO_COLOR)
+                    cv.putText(fra, str(obj.obj_id), bbox.cp, cv.FONT_HERSHEY_TRIPLEX, 1, OBJ_INFO_COLOR)
 
 
         def add_fra_info(fra):
@@ -700,27 +1115,402 @@ class VidAnnGUI:
                 FAST_MOVE_BBOX_RIGHT_KEY : self.vid.move_bbox_right,
                 FAST_MOVE_BBOX_UP_KEY    : self.vid.move_bbox_up,
                 FAST_MOVE_BBOX_DOWN_KEY  : self.vid.move_bbox_down,
+                NARROW_BBOX_KEY          : self.vid.narrow_bbox,
+                WIDEN_BBOX_KEY           : self.vid.widen_bbox,
+                SHORTEN_BBOX_KEY         : self.vid.shorten_bbox,
+                HEIGHTEN_BBOX_KEY        : self.vid.heighten_bbox,
                 MARK_KEY_FRA_KEY         : self.vid.mark_key,
                 MARK_AS_STA_KEY          : self.vid.mark_sta,
                 MARK_AS_END_KEY          : self.vid.mark_end,
                 UNMARK_KEY_FRA_KEY       : self.vid.unmark_key,
                 SAVE_KEY                 : self.vid.save,
+                UNDO_KEY                 : self.vid.undo,
+                REDO_KEY                 : self.vid.redo,
+                VALIDATE_KEY             : self.vid.validate,
+                GO_TO_NEXT_PROBLEM_KEY   : self.vid.go_to_next_problem,
                 TOGGLE_FRA_INFO_KEY      : self.vid.toggle_fra_info,
                 TOGGLE_OBJ_INFO_KEY      : self.vid.toggle_obj_info
             }
 
             if key in actions:
                 actions[key]()
+                self.vid.history.commit() # One edit per action
             elif key == EXIT_KEY:
                 break
             else:
                 print("Unknown command:", key)
 
-### Program
+### Validation
+
+# Tracks are int arrays w/ rows of (frano, tlx, tly, w, h) as in CSV files (frano starts from 1).
+# Problems are dicts w/ keys "kind", "obj", "fra" (firs problematic frano), "fras" (count) and "message".
+
+def get_ann_path(vid_path:str):
+    return vid_path[:vid_path.rfind("/")+1] + DEFAULT_ANN_DIR
+
+def get_shards_path(vid_path:str):
+    return vid_path[:vid_path.rfind("/")+1] + DEFAULT_SHARD_DIR
+
+def get_merged_shards_path(vid_path:str):
+    return vid_path[:vid_path.rfind("/")+1] + DEFAULT_MERGED_SHARD_DIR
+
+def read_obj_ids(ann_path:str):
+    files = os.listdir(ann_path) if os.path.isdir(ann_path) else []
+    return sorted({int(m.group(1)) for m in map(re.compile(r"^(\d+)_(key|all)\.csv$").match, files) if m})
+
+def get_key_track(obj:Obj):
+    key_track = [(fra_no + 1,) + obj.key_fras[fra_no].values() for fra_no in obj.get_sorted_key_fra_nos()]
+    return np.array(key_track, dtype=int)
+
+def get_track(obj:Obj):
+    return interpolate_track(get_key_track(obj))
+
+def interpolate_track(key_track:np.ndarray):
+    # Vectorized version of Obj.interpolate for all fra-s from firs to last key fra (gives the same values).
+    fra_nos  = np.arange(key_track[0, 0], key_track[-1, 0] + 1)
+    i        = np.searchsorted(key_track[:, 0], fra_nos, side="right") - 1
+    i        = np.minimum(i, len(key_track) - 2)
+    min_rows = key_track[i]
+    max_rows = key_track[i + 1]
+    ratio    = (fra_nos - min_rows[:, 0]) / (max_rows[:, 0] - min_rows[:, 0])
+    values   = min_rows[:, 1:] + ratio[:, None] * (max_rows[:, 1:] - min_rows[:, 1:])
+    track    = np.empty((len(fra_nos), 5), dtype=int)
+    track[:, 0]   = fra_nos
+    track[:, 1:3] = np.round(values[:, 0:2])
+    track[:, 3:5] = 2 * np.round(values[:, 2:4] / 2)
+    return track
+
+def clip_key_track(key_track:np.ndarray, firs_fra_no:int, last_fra_no:int):
+    # Key fra-s inside [firs_fra_no, last_fra_no] w/ interpolated sta/end at the borders (None if less than 2 fra-s remain).
+    sta_fra_no = max(key_track[ 0, 0], firs_fra_no)
+    end_fra_no = min(key_track[-1, 0], last_fra_no)
+    if sta_fra_no >= end_fra_no: return None
+    track = interpolate_track(key_track)
+    inner = key_track[(key_track[:, 0] > sta_fra_no) & (key_track[:, 0] < end_fra_no)]
+    return np.concatenate(([track[sta_fra_no - track[0, 0]]], inner, [track[end_fra_no - track[0, 0]]]))
+
+def read_track(path:str):
+    if os.path.getsize(path) == 0:
+        raise ValueError("{} is empty.".format(path))
+    track = np.loadtxt(path, delimiter=",", dtype=int, ndmin=2)
+    if track.shape[1] != 5:
+        raise ValueError("{} must have 5 columns.".format(path))
+    return track
+
+def find_runs(mask:np.ndarray):
+    # Returns (sta index, length) for each run of True values.
+    diffs = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    stas  = np.flatnonzero(diffs ==  1)
+    ends  = np.flatnonzero(diffs == -1)
+    return list(zip(stas.tolist(), (ends - stas).tolist()))
+
+def make_problem(kind:str, obj_no:int, fra_no:int, fra_count:int, message:str, **extra):
+    problem = {"kind": kind, "obj": obj_no, "fra": int(fra_no), "fras": int(fra_count), "message": message}
+    problem.update(extra)
+    return problem
+
+def check_bounds(obj_no:int, track:np.ndarray, fra_w:int, fra_h:int):
+    problems = []
+    tlx, tly, w, h = track[:, 1], track[:, 2], track[:, 3], track[:, 4]
+    for sta, count in find_runs((w <= 0) | (h <= 0)):
+        fra_no = track[sta, 0]
+        problems.append(make_problem("bad_size", obj_no, fra_no, count,
+                                     "Obj {} has non-positive w/h in {} fra-s from fra {}.".format(obj_no, count, fra_no)))
+    for sta, count in find_runs((tlx < 0) | (tly < 0) | (tlx + w > fra_w) | (tly + h > fra_h)):
+        fra_no = track[sta, 0]
+        problems.append(make_problem("out_of_frame", obj_no, fra_no, count,
+                                     "Obj {} is out of frame in {} fra-s from fra {}.".format(obj_no, count, fra_no)))
+    return problems
+
+def check_overlaps(key_tracks:dict, obj_nos:list=None, min_iou:float=DEFAULT_OVERLAP_IOU, min_fras:int=DEFAULT_OVERLAP_MIN_FRAS,
+                   tracks:dict=None):
+    # key_tracks: {obj_no: key track}. Checks pairs (a, b) w/ a < b and a in obj_nos (all obj-s if None),
+    # so that the pairs can be split into chunks. Only tracks of pairs that share enough fra-s are interpolated
+    # (tracks: {obj_no: track} of already interpolated ones, new ones are added to it).
+    if tracks is None: tracks = {}
+    problems = []
+    items    = sorted(key_tracks.items())
+    for a, (obj_no_a, key_track_a) in enumerate(items):
+        if obj_nos is not None and obj_no_a not in obj_nos: continue
+        for obj_no_b, key_track_b in items[a + 1:]:
+            sta = max(key_track_a[ 0, 0], key_track_b[ 0, 0])
+            end = min(key_track_a[-1, 0], key_track_b[-1, 0])
+            if end - sta + 1 < min_fras: continue
+            for obj_no, key_track in ((obj_no_a, key_track_a), (obj_no_b, key_track_b)):
+                if obj_no not in tracks: tracks[obj_no] = interpolate_track(key_track)
+            track_a = tracks[obj_no_a]
+            track_b = tracks[obj_no_b]
+            rows_a = track_a[sta - track_a[0, 0] : end - track_a[0, 0] + 1]
+            rows_b = track_b[sta - track_b[0, 0] : end - track_b[0, 0] + 1]
+            inter_w = np.minimum(rows_a[:, 1] + rows_a[:, 3], rows_b[:, 1] + rows_b[:, 3]) - np.maximum(rows_a[:, 1], rows_b[:, 1])
+            inter_h = np.minimum(rows_a[:, 2] + rows_a[:, 4], rows_b[:, 2] + rows_b[:, 4]) - np.maximum(rows_a[:, 2], rows_b[:, 2])
+            inter   = np.clip(inter_w, 0, None) * np.clip(inter_h, 0, None)
+            union   = rows_a[:, 3] * rows_a[:, 4] + rows_b[:, 3] * rows_b[:, 4] - inter
+            mask    = inter >= min_iou * np.maximum(union, 1)
+            count   = int(mask.sum())
+            if count >= min_fras:
+                fra_no = rows_a[np.argmax(mask), 0]
+                problems.append(make_problem("overlap", obj_no_a, fra_no, count,
+                                             "Obj-s {} and {} overlap (IoU >= {}) in {} fra-s from fra {}.".format(
+                                                 obj_no_a, obj_no_b, min_iou, count, fra_no),
+                                             other_obj=obj_no_b))
+    return problems
+
+def check_fra_nos(path:str, obj_no:int, track:np.ndarray, fra_count:int):
+    # Fra-s that are not in vid cannot be loaded.
+    invalid = (track[:, 0] < 1) | (track[:, 0] > fra_count)
+    if not np.any(invalid): return []
+    fra_no = track[np.argmax(invalid), 0]
+    count  = int(invalid.sum())
+    return [make_problem("bad_fra", obj_no, fra_no, count,
+                         "{} has {} rows w/ fra-s out of 1-{} (firs: fra {}).".format(path, count, fra_count, fra_no))]
+
+def check_obj_files(ann_path:str, obj_no:int, fra_w:int, fra_h:int, fra_count:int):
+    # Returns problems and key track (None if it is not valid).
+    key_csv_path = "{}/{}_key.csv".format(ann_path, obj_no)
+    all_csv_path = "{}/{}_all.csv".format(ann_path, obj_no)
+
+    try:
+        key_track = read_track(key_csv_path)
+    except (OSError, ValueError) as e:
+        return [make_problem("bad_file", obj_no, 0, 0, str(e))], None
+    if len(key_track) < 2 or np.any(np.diff(key_track[:, 0]) <= 0):
+        return [make_problem("bad_order", obj_no, key_track[0, 0], 0,
+                             "{} must have at least 2 rows w/ increasing fra-s.".format(key_csv_path))], None
+
+    track    = interpolate_track(key_track)
+    problems = check_fra_nos(key_csv_path, obj_no, key_track, fra_count)
+    problems += check_bounds(obj_no, track, fra_w, fra_h)
+
+    try:
+        all_track = read_track(all_csv_path)
+    except (OSError, ValueError) as e:
+        return problems + [make_problem("bad_file", obj_no, 0, 0, str(e))], key_track
+
+    problems += check_fra_nos(all_csv_path, obj_no, all_track, fra_count)
+    if np.any(np.diff(all_track[:, 0]) <= 0):
+        fra_no = all_track[np.argmax(np.diff(all_track[:, 0]) <= 0) + 1, 0]
+        problems.append(make_problem("bad_order", obj_no, fra_no, 1,
+                                     "{} has a repeated or decreasing fra at fra {}.".format(all_csv_path, fra_no)))
+
+    offsets = all_track[:, 0] - track[0, 0]
+    valid   = (offsets >= 0) & (offsets < len(track))
+    present = np.zeros(len(track), dtype=bool)
+    present[offsets[valid]] = True
+    for sta, count in find_runs(~present):
+        fra_no = track[sta, 0]
+        problems.append(make_problem("gap", obj_no, fra_no, count,
+                                     "{} misses {} fra-s from fra {}.".format(all_csv_path, count, fra_no)))
+
+    mismatch = ~valid
+    mismatch[valid] = np.any(all_track[valid, 1:] != track[offsets[valid], 1:], axis=1)
+    for sta, count in find_runs(mismatch):
+        fra_no = all_track[sta, 0]
+        problems.append(make_problem("key_all_mismatch", obj_no, fra_no, count,
+                                     "{} does not match key fra-s in {} rows from fra {}.".format(all_csv_path, count, fra_no)))
+
+    return problems, key_track
+
+def probe_vid(vid_path:str):
+    # Returns (fra_w, fra_h, fra_count), or None if vid cannot be read. Fra-s are counted like in Vid.
+    reader = cv.VideoCapture(vid_path)
+    valid, fra = reader.read()
+    fra_count = 0
+    while valid:
+        fra_count += 1
+        valid = reader.grab()
+    reader.release()
+    if fra_count == 0: return None
+    return fra.shape[1], fra.shape[0], fra_count
+
+def validate_vids(vid_paths:list, workers:int=None):
+    # Validates saved anns of vid-s in parallel (fra-s of all vid-s are counted, then obj-s of all vid-s are checked,
+    # then chunks of obj pairs of each vid). Returns a report.
+    chunk_count = workers or os.cpu_count() or 1
+    report = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        probe_futures = [executor.submit(probe_vid, vid_path) for vid_path in vid_paths]
+        obj_futures   = {}
+        for vid_path, probe_future in zip(vid_paths, probe_futures):
+            vid_info   = probe_future.result()
+            vid_report = {"vid": vid_path, "problems": []}
+            report.append(vid_report)
+            if vid_info is None:
+                vid_report["problems"].append(make_problem("bad_vid", None, 0, 0, "{} cannot be read.".format(vid_path)))
+                continue
+            ann_path = get_ann_path(vid_path)
+            fra_w, fra_h, fra_count = vid_info
+            obj_nos  = read_obj_ids(ann_path)
+            vid_report.update({"fra_w": fra_w, "fra_h": fra_h, "fra_count": fra_count, "objs": len(obj_nos)})
+            for obj_no in obj_nos:
+                obj_futures[vid_path, obj_no] = executor.submit(check_obj_files, ann_path, obj_no, fra_w, fra_h, fra_count)
+
+        overlap_futures = {}
+        for vid_report in report:
+            key_tracks = {}
+            for (vid_path, obj_no), future in obj_futures.items():
+                if vid_path != vid_report["vid"]: continue
+                problems, key_track = future.result()
+                vid_report["problems"] += problems
+                if key_track is not None:
+                    key_tracks[obj_no] = key_track
+            # Obj a is checked w/ all b > a, so chunks take every chunk_count-th obj to balance the pairs.
+            obj_nos = sorted(key_tracks)
+            overlap_futures[vid_report["vid"]] = [executor.submit(check_overlaps, key_tracks, set(obj_nos[i::chunk_count]))
+                                                  for i in range(min(chunk_count, len(obj_nos)))]
+
+        for vid_report in report:
+            overlap_problems = [problem for future in overlap_futures[vid_report["vid"]] for problem in future.result()]
+            vid_report["problems"] += sorted(overlap_problems, key=lambda problem: (problem["obj"], problem["other_obj"]))
+
+    return report
+
+### Sharding
+
+def write_obj_files(ann_path:str, obj_id:int, key_track:np.ndarray):
+    np.savetxt("{}/{}_key.csv".format(ann_path, obj_id), key_track, fmt="%d", delimiter=",")
+    np.savetxt("{}/{}_all.csv".format(ann_path, obj_id), interpolate_track(key_track), fmt="%d", delimiter=",")
+
+def read_key_tracks(ann_path:str, errors:list):
+    # Returns {obj id: key track} of valid obj-s. Problems are appended to errors.
+    key_tracks = {}
+    for obj_id in read_obj_ids(ann_path):
+        key_csv_path = "{}/{}_key.csv".format(ann_path, obj_id)
+        try:
+            key_track = read_track(key_csv_path)
+        except (OSError, ValueError) as e:
+            errors.append(str(e))
+            continue
+        if len(key_track) < 2 or np.any(np.diff(key_track[:, 0]) <= 0):
+            errors.append("{} must have at least 2 rows w/ increasing fra-s.".format(key_csv_path))
+            continue
+        key_tracks[obj_id] = key_track
+    return key_tracks
+
+def merge_shards(vid_path:str):
+    # Replaces claimed parts of gt w/ shards. Tracks w/ the same obj id are stitched (only their key fra-s are merged,
+    # so it takes linear time in total key fra-s). Merged shards are moved to a new round dir of merged shards, so that
+    # later merges do not apply them again. Returns False if shards cannot be merged (gt and shards are not changed).
+    ann_path    = get_ann_path(vid_path)
+    shards_path = get_shards_path(vid_path)
+    shard_paths = [entry.path for entry in os.scandir(shards_path) if entry.is_dir()] if os.path.isdir(shards_path) else []
+
+    # Read everything before changing gt
+    errors = []
+    shards = []
+    for path in sorted(shard_paths):
+        try:
+            shards.append((Shard.load_claim(path), path))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            errors.append("Bad shard {}: {!r}".format(path, e))
+    gt_key_tracks    = read_key_tracks(ann_path, errors)
+    shard_key_tracks = [read_key_tracks(path, errors) for _, path in shards]
+    if len(errors) > 0:
+        for error in errors: print(error)
+        print("Shards are not merged.")
+        return False
+
+    if len(shards) == 0:
+        print("No shards found in {}.".format(shards_path))
+        return False
+    for i, (shard, _) in enumerate(shards):
+        for other, _ in shards[i + 1:]:
+            if shard.overlaps(other):
+                print("Shards {} and {} claim the same anns.".format(shard.shard_no, other.shard_no))
+                return False
+
+    for (shard, _), key_tracks in zip(shards, shard_key_tracks):
+        for obj_id in sorted(set(key_tracks) & set(gt_key_tracks) - shard.seeded_obj_ids):
+            print("Obj {} of shard {} is not copied from gt but gt has an obj w/ the same id.".format(obj_id, shard.shard_no))
+            return False
+
+    deleted_obj_ids = set().union(*(shard.deleted_obj_ids for shard, _ in shards))
+    for (shard, _), key_tracks in zip(shards, shard_key_tracks):
+        for obj_id in deleted_obj_ids & set(key_tracks):
+            print("Obj {} is del. in a shard but kept in shard {}.".format(obj_id, shard.shard_no))
+            return False
+
+    pieces = {} # obj id -> key tracks
+    for obj_id, key_track in gt_key_tracks.items():
+        if obj_id in deleted_obj_ids: continue
+        claimed = sorted(shard.fra_range or (1, np.inf) for shard, _ in shards if obj_id in shard.seeded_obj_ids)
+        if len(claimed) > 0:
+            # Drop key fra-s replaced by shards (claims of an obj do not overlap)
+            stas, ends = np.array(claimed).T
+            i          = np.searchsorted(stas, key_track[:, 0], side="right") - 1
+            is_claimed = (i >= 0) & (key_track[:, 0] <= ends[np.maximum(i, 0)])
+            key_track  = key_track[~is_claimed]
+        pieces[obj_id] = [key_track]
+    for key_tracks in shard_key_tracks:
+        for obj_id, key_track in key_tracks.items():
+            pieces.setdefault(obj_id, []).append(key_track)
+
+    merged = {}
+    for obj_id, key_tracks in pieces.items():
+        key_track = np.concatenate(key_tracks)
+        key_track = key_track[np.argsort(key_track[:, 0], kind="stable")] # merges a few sorted runs
+        key_track = key_track[np.concatenate(([True], np.diff(key_track[:, 0]) > 0))]
+        if len(key_track) >= 2: # a track needs sta and end key fra-s
+            merged[obj_id] = key_track
+
+    os.makedirs(ann_path, exist_ok=True)
+    for obj_id in read_obj_ids(ann_path):
+        if obj_id not in merged:
+            for kind in ("key", "all"):
+                path = "{}/{}_{}.csv".format(ann_path, obj_id, kind)
+                if os.path.exists(path): os.remove(path)
+    for obj_id, key_track in merged.items():
+        write_obj_files(ann_path, obj_id, key_track)
+
+    merged_shards_path = get_merged_shards_path(vid_path)
+    round_no = 1
+    while os.path.exists("{}/{}".format(merged_shards_path, round_no)):
+        round_no += 1
+    round_path = "{}/{}".format(merged_shards_path, round_no)
+    os.makedirs(round_path)
+    for _, path in shards:
+        os.rename(path, "{}/{}".format(round_path, os.path.basename(path)))
+
+    print("{} shard(s) merged into {} ({} obj-s) and moved to {}.".format(len(shards), ann_path, len(merged), round_path))
+    return True
 
-vid_path  = input("Enter vid path (e.g. video/vid_%05d.png):")
-bbox_size = int(input("Enter bbox size (e.g. 30):"))
+### Program
 
-vid         = Vid(vid_path, bbox_size)
-vid_ann_gui = VidAnnGUI(vid)
-vid_ann_gui.run()
+if __name__ == "__main__":
+
+    if len(sys.argv) > 1 and sys.argv[1] == VALIDATE_COMMAND:
+        report = validate_vids(sys.argv[2:])
+        print(json.dumps(report, indent=4))
+        sys.exit(1 if any(vid_report["problems"] for vid_report in report) else 0)
+
+    if len(sys.argv) > 1 and sys.argv[1] == MERGE_COMMAND:
+        merged = [merge_shards(vid_path) for vid_path in sys.argv[2:]]
+        sys.exit(0 if all(merged) else 1)
+
+    vid_path  = input("Enter vid path (e.g. video/vid_%05d.png):")
+    bbox_size = input("Enter default bbox size (e.g. 30 or 40x30):")
+    bbox_w    = int(bbox_size.split("x")[0] )
+    bbox_h    = int(bbox_size.split("x")[-1])
+
+    vid = None
+    while vid is None:
+        shard    = None
+        shard_no = input("Enter shard no (to annotate a part of vid w/ others, empty for whole vid):")
+        try:
+            if shard_no != "":
+                shard = Shard(int(shard_no))
+                if os.path.exists(shard.get_path(vid_path)):
+                    shard = Shard.load_claim(shard.get_path(vid_path))
+                else:
+                    fra_range = input("Enter claimed fra range (e.g. 1-500, empty for all fra-s):")
+                    obj_ids   = input("Enter claimed obj ids (e.g. 0,3, empty for all obj-s):")
+                    fra_range = None if fra_range == "" else tuple(map(int, fra_range.split("-")))
+                    obj_ids   = None if obj_ids   == "" else list(map(int, obj_ids.split(",")))
+                    shard     = Shard(int(shard_no), fra_range, obj_ids)
+            vid = Vid(vid_path, bbox_w, bbox_h, shard=shard)
+        except ValueError as e:
+            print(e)
+            print("Try again.")
+
+    vid_ann_gui = VidAnnGUI(vid)
+    vid_ann_gui.run()
@@ -0,0 +1,45 @@
+import os
+import sys
+import types
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import cv2
+except ImportError: # Only VideoCapture is used by the tests and it is replaced by FakeCapture.
+    sys.modules["cv2"] = types.ModuleType("cv2")
+
+import VideoAnnotationForTracking as vat
+
+FRA_W     = 120
+FRA_H     = 100
+FRA_COUNT = 50
+
+class FakeCapture:
+    # A vid of FRA_COUNT black fra-s.
+
+    def __init__(self, path):
+        self.fra_no = 0
+
+    def read(self):
+        self.fra_no += 1
+        return self.fra_no <= FRA_COUNT, np.zeros((FRA_H, FRA_W, 3), np.uint8)
+
+    def grab(self):
+        return self.read()[0]
+
+    def release(self):
+        pass
+
+def go_to(vid, fra_no):
+    # Like going to a fra in the GUI.
+    vid.active_fra = fra_no
+    vid.update_active_bbox()
+
+@pytest.fixture
+def vid_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(vat.cv, "VideoCapture", FakeCapture, raising=False)
+    return str(tmp_path / "vid.avi")
@@ -0,0 +1,81 @@
+import VideoAnnotationForTracking as vat
+from conftest import FRA_W, go_to
+
+def test_w_h_are_interpolated_as_even_numbers(vid_path):
+    vid = vat.Vid(vid_path, 20, 10)
+    obj = vid.objs[0]
+    go_to(vid, 49)
+    vid.move_bbox_right()
+    vid.move_bbox_down()
+    for _ in range(5):
+        vid.widen_bbox()
+        vid.heighten_bbox()
+    assert obj.key_fras[49].values() == (35, 35, 30, 20) # cp is kept
+    go_to(vid, 20)
+    for _ in range(5):
+        vid.move_bbox_1px_right()
+        vid.move_bbox_1px_down()
+    vid.heighten_bbox()
+    vid.mark_key()
+    for fra_no in range(50):
+        bbox = obj.get_bbox(fra_no)
+        assert bbox.w % 2 == 0 and bbox.h % 2 == 0
+    assert [(fra_no,) + obj.get_bbox(fra_no).values() for fra_no in range(50)] == list(obj.iter_values())
+
+def test_widen_stops_at_fra_border(vid_path):
+    vid = vat.Vid(vid_path, 20, 10)
+    go_to(vid, 0)
+    for _ in range(10):
+        vid.move_bbox_right()
+    for _ in range(FRA_W):
+        vid.widen_bbox()
+    bbox = vid.active_bbox
+    assert bbox.tlx >= 0 and bbox.tlx + bbox.w <= FRA_W
+
+def test_resizing_sta_changes_default_size_of_obj(vid_path):
+    vid = vat.Vid(vid_path, 20, 10)
+    obj = vid.objs[0]
+    go_to(vid, 0)
+    vid.move_bbox_down()
+    vid.narrow_bbox()
+    vid.history.commit()
+    assert (obj.bbox_w, obj.bbox_h) == (18, 10)
+    go_to(vid, 10)
+    vid.narrow_bbox() # not a key fra
+    assert (obj.bbox_w, obj.bbox_h) == (18, 10)
+    vid.undo()
+    assert (obj.bbox_w, obj.bbox_h) == (20, 10)
+    vid.redo()
+    assert (obj.bbox_w, obj.bbox_h) == (18, 10)
+
+def test_sizes_round_trip_through_save_and_load(vid_path):
+    vid = vat.Vid(vid_path, 20, 10)
+    obj = vid.objs[0]
+    go_to(vid, 30)
+    vid.move_bbox_down()
+    vid.heighten_bbox()
+    vid.mark_key()
+    go_to(vid, 49)
+    vid.move_bbox_right()
+    vid.widen_bbox()
+    vid.save()
+    loaded = vat.Vid(vid_path, 8, 8).objs[0]
+    assert {f: b.values() for f, b in loaded.key_fras.items()} == {f: b.values() for f, b in obj.key_fras.items()}
+    assert (loaded.bbox_w, loaded.bbox_h) == (20, 10)
+
+def test_default_bbox_grows_away_from_fra_border(vid_path):
+    vid = vat.Vid(vid_path, 20, 10)
+    obj = vid.objs[0]
+    go_to(vid, 0)
+    assert vid.active_bbox.values() == (0, 0, 20, 10)
+    vid.widen_bbox()
+    vid.heighten_bbox()
+    assert obj.key_fras[0].values() == (0, 0, 22, 12)
+    vid.move_bbox_1px_right()
+    vid.widen_bbox() # tlx = 1, so center is kept
+    assert obj.key_fras[0].values() == (0, 0, 24, 12)
+    go_to(vid, 49)
+    for _ in range(10):
+        vid.move_bbox_right()
+    vid.widen_bbox()
+    assert obj.key_fras[49].values() == (FRA_W - 22, 0, 22, 10)
@@ -0,0 +1,74 @@
+import VideoAnnotationForTracking as vat
+from conftest import go_to
+
+def act(vid, action, *args):
+    # Like VidAnnGUI.run: one edit per action.
+    action(*args)
+    vid.history.commit()
+
+def test_loaded_anns_cannot_be_undone(vid_path):
+    vid = vat.Vid(vid_path, 20, 10)
+    assert len(vid.history.undo_edits) == 0
+
+def test_undo_redo_mark_key_and_merged_moves(vid_path):
+    vid = vat.Vid(vid_path, 20, 10)
+    obj = vid.objs[0]
+    go_to(vid, 10)
+    act(vid, vid.move_bbox_down)
+    act(vid, vid.mark_key)
+    for _ in range(5):
+        act(vid, vid.move_bbox_1px_right)
+    assert obj.key_fras[10].values() == (5, 40, 20, 10)
+    assert len(vid.history.undo_edits) == 2 # moves of the same key fra are one edit
+
+    go_to(vid, 0)
+    act(vid, vid.undo)
+    assert obj.key_fras[10].values() == (0, 40, 20, 10)
+    assert vid.active_fra == 10 # undo shows the changed fra
+    act(vid, vid.undo)
+    assert 10 not in obj.key_fras
+
+    act(vid, vid.redo)
+    act(vid, vid.redo)
+    assert obj.key_fras[10].values() == (5, 40, 20, 10)
+
+def test_undo_sta_restores_deleted_key_fras(vid_path):
+    vid = vat.Vid(vid_path, 20, 10)
+    obj = vid.objs[0]
+    go_to(vid, 10)
+    act(vid, vid.mark_key)
+    go_to(vid, 20)
+    act(vid, vid.mark_sta)
+    assert obj.sta_fra_no == 20 and 10 not in obj.key_fras and 0 not in obj.key_fras
+
+    go_to(vid, 40)
+    act(vid, vid.undo)
+    assert obj.sta_fra_no == 0 and {0, 10, 49} == set(obj.key_fras)
+    assert vid.active_fra == 0 # old sta fra
+    assert [obj.get_bbox(fra_no).values() for fra_no in range(50)] == [(0, 0, 20, 10)] * 50
+
+    act(vid, vid.redo)
+    assert obj.sta_fra_no == 20 and vid.active_fra == 20
+
+def test_undo_del_curr_obj_restores_order(vid_path):
+    vid = vat.Vid(vid_path, 20, 10)
+    act(vid, vid.create_new_obj)
+    act(vid, vid.create_new_obj)
+    objs = list(vid.objs)
+    vid.active_obj = 1
+    act(vid, vid.del_curr_obj)
+    assert vid.objs == [objs[0], objs[2]]
+    act(vid, vid.undo)
+    assert vid.objs == objs and vid.active_obj == 1
+    act(vid, vid.redo)
+    assert vid.objs == [objs[0], objs[2]]
+
+def test_history_is_bounded(vid_path):
+    vid = vat.Vid(vid_path, 20, 10)
+    vid.history = vat.History(limit=3)
+    for obj in vid.objs:
+        obj.history = vid.history
+    for fra_no in range(1, 10):
+        go_to(vid, fra_no)
+        act(vid, vid.mark_key)
+    assert len(vid.history.undo_edits) == 3
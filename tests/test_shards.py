@@ -0,0 +1,214 @@
+import os
+
+import numpy as np
+import pytest
+
+import VideoAnnotationForTracking as vat
+from conftest import go_to
+
+def read_csv(path):
+    return np.loadtxt(path, delimiter=",", dtype=int, ndmin=2)
+
+def make_gt(vid_path, obj_count=2):
+    vid = vat.Vid(vid_path, 20, 10)
+    for _ in range(obj_count - 1):
+        vid.create_new_obj()
+    for obj_no in range(obj_count):
+        vid.active_obj = obj_no
+        go_to(vid, 49)
+        vid.move_bbox_right()
+        vid.move_bbox_down()
+    vid.save()
+    return vid
+
+def test_merge_of_untouched_shards_keeps_what_annotators_saw(vid_path):
+    make_gt(vid_path)
+    ann_path = vat.get_ann_path(vid_path)
+    gt_all   = read_csv(ann_path + "/0_all.csv")
+    shard_a  = vat.Vid(vid_path, 20, 10, shard=vat.Shard(1, (1, 25)))
+    shard_b  = vat.Vid(vid_path, 20, 10, shard=vat.Shard(2, (26, 50), [0]))
+    assert [obj.obj_id for obj in shard_a.objs] == [0, 1] and [obj.obj_id for obj in shard_b.objs] == [0]
+    shard_all  = np.concatenate([read_csv(shard.ann_path + "/0_all.csv") for shard in (shard_a, shard_b)])
+    assert vat.merge_shards(vid_path)
+    merged_all = read_csv(ann_path + "/0_all.csv")
+    assert (merged_all == shard_all).all()
+    assert np.abs(merged_all - gt_all).max() <= 1 # border key fra-s are rounded
+    assert vat.read_obj_ids(ann_path) == [0, 1]
+
+def test_merge_stitches_edits_across_fra_ranges(vid_path):
+    make_gt(vid_path, obj_count=1)
+    shard_a = vat.Vid(vid_path, 20, 10, shard=vat.Shard(1, (1, 25)))
+    shard_b = vat.Vid(vid_path, 20, 10, shard=vat.Shard(2, (26, 50)))
+    go_to(shard_a, 10)
+    shard_a.move_bbox_right()
+    shard_a.mark_key()
+    shard_a.create_new_obj()
+    shard_a.save()
+    go_to(shard_b, 39)
+    shard_b.move_bbox_left()
+    shard_b.mark_key()
+    shard_b.save()
+    assert vat.merge_shards(vid_path)
+    ann_path = vat.get_ann_path(vid_path)
+    assert vat.read_obj_ids(ann_path) == [0, vat.SHARD_OBJ_ID_STRIDE]
+    key_fra_nos = read_csv(ann_path + "/0_key.csv")[:, 0].tolist()
+    assert key_fra_nos == [1, 11, 25, 26, 40, 50]
+    merged = vat.Vid(vid_path, 20, 10).objs[0]
+    assert merged.get_bbox(10).values() == shard_a.objs[0].get_bbox(10).values()
+    assert merged.get_bbox(39).values() == shard_b.objs[0].get_bbox(39).values()
+
+def test_merge_keeps_obj_that_only_touches_claimed_range(vid_path):
+    # Regression: obj w/ key fra-s 1 and 25, shard claims 25-50 (one common fra, so obj is not copied to shard).
+    ann_path = vat.get_ann_path(vid_path)
+    vat.os.mkdir(ann_path)
+    key_track = np.array([(1, 0, 0, 20, 10), (25, 40, 40, 20, 10)])
+    vat.write_obj_files(ann_path, 0, key_track)
+    shard = vat.Vid(vid_path, 20, 10, shard=vat.Shard(1, (25, 50)))
+    assert shard.shard.seeded_obj_ids == set()
+    assert vat.merge_shards(vid_path)
+    assert (read_csv(ann_path + "/0_key.csv") == key_track).all()
+
+def test_merge_rejects_overlapping_claims(vid_path):
+    make_gt(vid_path)
+    vat.Vid(vid_path, 20, 10, shard=vat.Shard(1, (1, 30)))
+    vat.Vid(vid_path, 20, 10, shard=vat.Shard(2, (20, 50), [0]))
+    ann_path = vat.get_ann_path(vid_path)
+    gt_key   = read_csv(ann_path + "/0_key.csv")
+    assert not vat.merge_shards(vid_path)
+    assert (read_csv(ann_path + "/0_key.csv") == gt_key).all()
+
+def make_gt_w_mid_key_fra(vid_path):
+    vid = make_gt(vid_path, obj_count=2)
+    vid.active_obj = 0
+    go_to(vid, 24)
+    vid.move_bbox_right()
+    vid.mark_key()
+    vid.save()
+
+def test_obj_del_in_shard_is_del_at_merge(vid_path):
+    make_gt_w_mid_key_fra(vid_path)
+    shard = vat.Vid(vid_path, 20, 10, shard=vat.Shard(1, (20, 30)))
+    shard.active_obj = 0
+    shard.del_curr_obj()
+    shard.save()
+    assert vat.Shard.load_claim(shard.ann_path).deleted_obj_ids == {0}
+    assert vat.merge_shards(vid_path)
+    assert vat.read_obj_ids(vat.get_ann_path(vid_path)) == [1]
+
+def test_undone_del_is_not_recorded(vid_path):
+    make_gt_w_mid_key_fra(vid_path)
+    shard = vat.Vid(vid_path, 20, 10, shard=vat.Shard(1, (20, 30)))
+    shard.active_obj = 0
+    shard.del_curr_obj()
+    shard.history.commit()
+    shard.undo()
+    shard.save()
+    assert vat.Shard.load_claim(shard.ann_path).deleted_obj_ids == set()
+    assert vat.merge_shards(vid_path)
+    assert vat.read_obj_ids(vat.get_ann_path(vid_path)) == [0, 1]
+
+def test_placeholder_obj_is_not_saved_or_merged(vid_path):
+    make_gt(vid_path, obj_count=1)
+    shard = vat.Vid(vid_path, 20, 10, shard=vat.Shard(1, (20, 30)))
+    shard.del_curr_obj()
+    assert [obj.obj_id for obj in shard.objs] == [vat.SHARD_OBJ_ID_STRIDE] # placeholder
+    shard.save()
+    assert vat.read_obj_ids(shard.ann_path) == []
+    assert vat.merge_shards(vid_path)
+    assert vat.read_obj_ids(vat.get_ann_path(vid_path)) == []
+
+    empty_shard = vat.Vid(vid_path, 20, 10, shard=vat.Shard(2))
+    go_to(empty_shard, 10)
+    empty_shard.move_bbox_down() # changed placeholder is a real obj
+    empty_shard.mark_key()
+    empty_shard.save()
+    assert vat.read_obj_ids(empty_shard.ann_path) == [2 * vat.SHARD_OBJ_ID_STRIDE]
+
+def test_merge_rejects_obj_del_in_one_shard_and_kept_in_another(vid_path):
+    make_gt_w_mid_key_fra(vid_path)
+    shard_a = vat.Vid(vid_path, 20, 10, shard=vat.Shard(1, (1, 25)))
+    vat.Vid(vid_path, 20, 10, shard=vat.Shard(2, (26, 50)))
+    shard_a.active_obj = 0
+    shard_a.del_curr_obj()
+    shard_a.save()
+    assert not vat.merge_shards(vid_path)
+    assert vat.read_obj_ids(vat.get_ann_path(vid_path)) == [0, 1]
+
+def test_merge_reports_bad_files_wo_changing_gt(vid_path, capsys):
+    make_gt(vid_path)
+    ann_path = vat.get_ann_path(vid_path)
+    shard    = vat.Vid(vid_path, 20, 10, shard=vat.Shard(1, (1, 25)))
+    vat.os.remove(shard.ann_path + "/1_key.csv") # only "all" file is left
+    open(shard.ann_path + "/0_key.csv", "w").close()
+    vat.os.makedirs(vat.get_shards_path(vid_path) + "/notes") # no claim.json
+    gt_files = {obj_id: read_csv("{}/{}_key.csv".format(ann_path, obj_id)) for obj_id in (0, 1)}
+    assert not vat.merge_shards(vid_path)
+    output = capsys.readouterr().out
+    assert "notes" in output and "1_key.csv" in output and "0_key.csv is empty" in output
+    for obj_id, key_track in gt_files.items():
+        assert (read_csv("{}/{}_key.csv".format(ann_path, obj_id)) == key_track).all()
+
+def test_new_obj_ids_are_not_reused_after_merge(vid_path):
+    make_gt(vid_path, obj_count=1)
+    shard = vat.Vid(vid_path, 20, 10, shard=vat.Shard(1, (1, 25)))
+    shard.create_new_obj()
+    shard.save()
+    assert vat.merge_shards(vid_path)
+    shard = vat.Vid(vid_path, 20, 10, shard=vat.Shard(1, (30, 50)))
+    assert [obj.obj_id for obj in shard.objs] == [0] # gt obj 1000000 is not in claimed fra-s
+    shard.create_new_obj()
+    assert shard.objs[-1].obj_id == vat.SHARD_OBJ_ID_STRIDE + 1
+
+def test_merge_rejects_new_obj_w_id_of_gt_obj(vid_path):
+    make_gt(vid_path, obj_count=1)
+    ann_path = vat.get_ann_path(vid_path)
+    vat.write_obj_files(ann_path, vat.SHARD_OBJ_ID_STRIDE, np.array([(1, 0, 0, 20, 10), (25, 0, 0, 20, 10)]))
+    shard = vat.Vid(vid_path, 20, 10, shard=vat.Shard(1, (30, 50)))
+    vat.write_obj_files(shard.ann_path, vat.SHARD_OBJ_ID_STRIDE, np.array([(30, 0, 0, 20, 10), (50, 0, 0, 20, 10)]))
+    assert not vat.merge_shards(vid_path)
+    assert read_csv("{}/{}_key.csv".format(ann_path, vat.SHARD_OBJ_ID_STRIDE))[:, 0].tolist() == [1, 25]
+
+def test_merged_shards_are_not_merged_again(vid_path):
+    make_gt(vid_path, obj_count=1)
+    vat.Vid(vid_path, 20, 10, shard=vat.Shard(1, (1, 25)))
+    assert vat.merge_shards(vid_path)
+    assert os.listdir(vat.get_shards_path(vid_path)) == []
+    assert os.listdir(vat.get_merged_shards_path(vid_path) + "/1") == ["1"]
+    gt = vat.Vid(vid_path, 20, 10)
+    go_to(gt, 10)
+    gt.move_bbox_down()
+    gt.mark_key()
+    gt.save()
+    vat.Vid(vid_path, 20, 10, shard=vat.Shard(2, (26, 50)))
+    assert vat.merge_shards(vid_path)
+    ann_path = vat.get_ann_path(vid_path)
+    assert read_csv(ann_path + "/0_key.csv")[:, 0].tolist() == [1, 11, 25, 26, 50]
+    assert os.listdir(vat.get_merged_shards_path(vid_path) + "/2") == ["2"]
+    assert not vat.merge_shards(vid_path) # nothing left to merge
+
+def test_claims_out_of_vid_are_rejected_before_shard_is_created(vid_path):
+    make_gt(vid_path, obj_count=1)
+    with pytest.raises(ValueError):
+        vat.Vid(vid_path, 20, 10, shard=vat.Shard(1, (50, 100))) # only 1 fra in vid
+    assert not os.path.exists(vat.Shard(1).get_path(vid_path))
+    with pytest.raises(ValueError):
+        vat.Shard(1, (30, 20))
+    shard = vat.Vid(vid_path, 20, 10, shard=vat.Shard(1, (49, 100)))
+    assert (shard.firs_fra_no, shard.last_fra_no) == (48, 49)
+
+def test_undone_change_of_placeholder_obj_is_not_saved(vid_path):
+    make_gt(vid_path, obj_count=1)
+    shard = vat.Vid(vid_path, 20, 10, shard=vat.Shard(1, (20, 30), [5])) # no gt obj is claimed
+    placeholder = shard.objs[0]
+    go_to(shard, 19)
+    shard.move_bbox_down()
+    shard.history.commit()
+    shard.move_bbox_down() # merged w/ the firs move
+    shard.history.commit()
+    assert not placeholder.placeholder
+    shard.undo()
+    assert placeholder.placeholder and placeholder.key_fras[19].values() == (0, 0, 20, 10)
+    shard.save()
+    assert vat.read_obj_ids(shard.ann_path) == []
+    shard.redo()
+    assert not placeholder.placeholder and placeholder.key_fras[19].values() == (0, 80, 20, 10)
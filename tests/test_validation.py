@@ -0,0 +1,100 @@
+import random
+
+import numpy as np
+
+import VideoAnnotationForTracking as vat
+from conftest import FRA_COUNT
+
+def write_csv(path, rows):
+    with open(path, "w") as file:
+        file.write("".join("{},{},{},{},{}\n".format(*row) for row in rows))
+
+def problem_kinds(report):
+    return sorted((problem["kind"], problem["obj"]) for problem in report[0]["problems"])
+
+def test_interpolate_track_matches_obj_interpolate():
+    rng = random.Random(0)
+    for _ in range(50):
+        fra_nos = sorted(rng.sample(range(FRA_COUNT), rng.randint(2, 8)))
+        obj = vat.Obj(0, 20, 10, FRA_COUNT, firs_fra_no=0, last_fra_no=FRA_COUNT - 1)
+        obj.set_sta_fra(fra_nos[0], vat.BBox(20, 10))
+        obj.set_end_fra(fra_nos[-1], vat.BBox(20, 10))
+        for fra_no in fra_nos:
+            bbox = vat.BBox(2 * rng.randint(1, 30), 2 * rng.randint(1, 30)).set_tl((rng.randint(-50, 100), rng.randint(-50, 100)))
+            obj.key_fras[fra_no] = bbox
+        obj.key_fras_changed()
+        expected = np.array([(row[0] + 1,) + row[1:] for row in obj.iter_values()]) # +1 as in CSV files
+        assert (vat.get_track(obj) == expected).all()
+
+def test_saved_anns_are_valid(vid_path):
+    vid = vat.Vid(vid_path, 20, 10)
+    vid.go_to_end_fra()
+    vid.move_bbox_right()
+    vid.create_new_obj()
+    vid.save()
+    report = vat.validate_vids([vid_path], workers=2)
+    assert report[0]["problems"] == [] and report[0]["fra_count"] == FRA_COUNT
+
+def test_problems_in_files_are_found(vid_path):
+    vid = vat.Vid(vid_path, 20, 10)
+    vid.go_to_end_fra()
+    vid.move_bbox_down()
+    vid.save()
+    ann_path = vat.get_ann_path(vid_path)
+    all_rows = np.loadtxt(ann_path + "/0_all.csv", delimiter=",", dtype=int).tolist()
+    all_rows[30][1] += 1
+    del all_rows[5:8]
+    write_csv(ann_path + "/0_all.csv", all_rows)
+    write_csv(ann_path + "/1_key.csv", [(1, -5, 0, 20, 10), (50, 0, 0, 20, 10)])
+    write_csv(ann_path + "/1_all.csv", vat.interpolate_track(np.array([(1, -5, 0, 20, 10), (50, 0, 0, 20, 10)])))
+    open(ann_path + "/2_key.csv", "w").close()
+    report = vat.validate_vids([vid_path])
+    assert problem_kinds(report) == [("bad_file", 2), ("gap", 0), ("key_all_mismatch", 0), ("out_of_frame", 1)]
+
+def test_fra_nos_out_of_vid_are_found(vid_path):
+    ann_path = vat.get_ann_path(vid_path)
+    vat.os.mkdir(ann_path)
+    key_rows = np.array([(20, 0, 0, 20, 10), (FRA_COUNT + 100, 0, 0, 20, 10)])
+    write_csv(ann_path + "/0_key.csv", key_rows)
+    write_csv(ann_path + "/0_all.csv", vat.interpolate_track(key_rows))
+    report = vat.validate_vids([vid_path])
+    problems = report[0]["problems"]
+    assert [problem["kind"] for problem in problems] == ["bad_fra", "bad_fra"]
+    assert problems[0]["fra"] == FRA_COUNT + 100 and problems[1]["fra"] == FRA_COUNT + 1
+
+def test_overlapping_objs_are_found(vid_path):
+    vid = vat.Vid(vid_path, 20, 10)
+    for _ in range(3):
+        vid.create_new_obj()
+    vid.active_obj = 3
+    vid.go_to_end_fra()
+    vid.move_bbox_right() # obj 3 is far from others
+    vid.save()
+    report = vat.validate_vids([vid_path], workers=2)
+    assert problem_kinds(report) == [("overlap", 0), ("overlap", 0), ("overlap", 1)]
+    vid.validate()
+    assert sorted((problem["obj"], problem["other_obj"]) for problem in vid.problems) == [(0, 1), (0, 2), (1, 2)]
+
+def test_overlap_chunks_find_same_pairs_as_one_chunk():
+    rng = random.Random(1)
+    key_tracks = {}
+    for obj_no in range(12):
+        tlx, tly = rng.choice([(0, 0), (2, 1), (60, 60)])
+        key_tracks[obj_no] = np.array([(rng.randint(1, 5), tlx, tly, 20, 10), (rng.randint(40, 50), tlx, tly, 20, 10)])
+    pairs = lambda problems: sorted((problem["obj"], problem["other_obj"]) for problem in problems)
+    expected = pairs(vat.check_overlaps(key_tracks))
+    assert len(expected) > 0
+    obj_nos = sorted(key_tracks)
+    for chunk_count in (2, 5):
+        chunks = [set(obj_nos[i::chunk_count]) for i in range(chunk_count)]
+        assert pairs(sum((vat.check_overlaps(key_tracks, chunk) for chunk in chunks), [])) == expected
+
+def test_overlap_chunks_interpolate_only_tracks_they_compare():
+    key_tracks = {0: np.array([(1, 0, 0, 20, 10), (20, 0, 0, 20, 10)]),
+                  1: np.array([(1, 0, 0, 20, 10), (20, 0, 0, 20, 10)]),
+                  2: np.array([(30, 0, 0, 20, 10), (50, 0, 0, 20, 10)])}
+    tracks = {}
+    assert vat.check_overlaps(key_tracks, {1, 2}, tracks=tracks) == []
+    assert tracks == {}
+    assert len(vat.check_overlaps(key_tracks, {0}, tracks=tracks)) == 1
+    assert sorted(tracks) == [0, 1]